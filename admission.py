@@ -0,0 +1,191 @@
+# admission.py - Admission control and load shedding for the /ask endpoint
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+PRIORITY_HIGH = 0    # Predefined questions: cheap, well-covered, jump the queue
+PRIORITY_NORMAL = 1  # Free-text questions
+
+class AdmissionRejected(Exception):
+    """Raised when a request is rate limited (429) or shed (503)"""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `burst` tokens"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """Take one token; return 0 on success or the seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'state')
+
+    def __init__(self, priority, seq):
+        self.priority = priority
+        self.seq = seq
+        self.state = 'waiting'
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class AdmissionController:
+    """Concurrency cap with a bounded priority queue and per-client rate limits.
+
+    At most `max_concurrency` requests run at once. Others wait in a queue of
+    at most `max_queue` entries, ordered by priority then arrival. A request
+    is shed with 503 when the queue is full, when its estimated wait exceeds
+    `latency_budget` seconds, or when it actually waits that long. A client
+    over its token bucket gets 429. A `rate` of 0 disables per-client limits.
+    """
+
+    def __init__(self, max_concurrency=4, max_queue=16, latency_budget=10.0,
+                 rate=0.5, burst=10, max_clients=10000):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.latency_budget = latency_budget
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+
+        self._cond = threading.Condition()
+        self._waiters = []  # heap of _Waiter
+        self._seq = itertools.count()
+        self._buckets = OrderedDict()
+        self._in_flight = 0
+        self._service_time = None  # EWMA of seconds per admitted request
+
+        self._admitted = 0
+        self._shed = {'rate_limited': 0, 'queue_full': 0, 'latency_budget': 0,
+                      'queue_timeout': 0, 'evicted': 0}
+
+    def _check_rate(self, client_id, now):
+        if not self.rate:
+            return
+
+        bucket = self._buckets.pop(client_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) >= self.max_clients:
+                self._buckets.popitem(last=False)
+        self._buckets[client_id] = bucket
+
+        wait = bucket.take(now)
+        if wait:
+            self._shed['rate_limited'] += 1
+            raise AdmissionRejected(429, 'rate_limited', math.ceil(wait))
+
+    def _estimated_wait(self, ahead):
+        """Seconds a request with `ahead` requests in front of it is expected to wait"""
+        if self._service_time is None:
+            return 0.0
+        return (ahead // self.max_concurrency + 1) * self._service_time
+
+    def _retry_after(self):
+        return max(1, math.ceil(self._estimated_wait(len(self._waiters))))
+
+    def _reject(self, reason):
+        self._shed[reason] += 1
+        return AdmissionRejected(503, reason, self._retry_after())
+
+    def acquire(self, client_id, priority=PRIORITY_NORMAL):
+        """Block until the request may run; raise AdmissionRejected otherwise"""
+        with self._cond:
+            now = time.monotonic()
+            self._check_rate(client_id, now)
+
+            if self._in_flight < self.max_concurrency and not self._waiters:
+                self._in_flight += 1
+                self._admitted += 1
+                return
+
+            ahead = sum(1 for waiter in self._waiters if waiter.priority <= priority)
+            if self._estimated_wait(ahead) > self.latency_budget:
+                raise self._reject('latency_budget')
+
+            if len(self._waiters) >= self.max_queue:
+                # A higher-priority request takes the place of the newest lowest-priority one
+                worst = max(self._waiters)
+                if worst.priority <= priority:
+                    raise self._reject('queue_full')
+                self._waiters.remove(worst)
+                heapq.heapify(self._waiters)
+                worst.state = 'evicted'
+                self._shed['evicted'] += 1
+
+            waiter = _Waiter(priority, next(self._seq))
+            heapq.heappush(self._waiters, waiter)
+            self._cond.notify_all()
+
+            deadline = now + self.latency_budget
+            while True:
+                if waiter.state == 'evicted':
+                    raise AdmissionRejected(503, 'evicted', self._retry_after())
+
+                if self._in_flight < self.max_concurrency and self._waiters[0] is waiter:
+                    heapq.heappop(self._waiters)
+                    self._in_flight += 1
+                    self._admitted += 1
+                    self._cond.notify_all()
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                    raise self._reject('queue_timeout')
+
+                self._cond.wait(remaining)
+
+    def release(self, service_time):
+        """Free a slot and fold the request's duration into the service time estimate"""
+        with self._cond:
+            self._in_flight -= 1
+            if self._service_time is None:
+                self._service_time = service_time
+            else:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, client_id, priority=PRIORITY_NORMAL):
+        """Context manager wrapping acquire/release around one request"""
+        self.acquire(client_id, priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self):
+        """Snapshot of queue depth, in-flight requests and shed counts"""
+        with self._cond:
+            return {
+                'in_flight': self._in_flight,
+                'queue_depth': len(self._waiters),
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'admitted': self._admitted,
+                'shed': dict(self._shed),
+                'service_time_ewma': round(self._service_time, 3) if self._service_time is not None else None
+            }
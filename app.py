@@ -2,35 +2,144 @@ import os
 import warnings
 warnings.filterwarnings('ignore')
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, render_template_string, send_file, abort
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 load_dotenv()
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_chroma import Chroma
+from chromadb.api.client import SharedSystemClient
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
+from lexical import BM25Index, HybridRetriever
+from shared_index import SharedVectorIndex
+from admission import AdmissionController, AdmissionRejected, PRIORITY_HIGH, PRIORITY_NORMAL
+from profiling import RequestProfiler, ADMIN_HEADER, invoke_config, span
+from corpora import CorpusCache, DEFAULT_CORPUS, estimate_index_bytes, load_corpora
 import hashlib
 import json
+import fcntl
+import shutil
+import tempfile
+from contextlib import contextmanager
 
 app = Flask(__name__)
 
+# Trust X-Forwarded-For only as far as the proxies in front of us (Railway
+# adds one), so request.remote_addr is the address the proxy actually saw
+# rather than whatever the client put in the header
+proxy_count = int(os.getenv("PROXY_COUNT", 1))
+if proxy_count:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_count)
+
 # Global variables for the RAG system
-qa_chain = None
 is_initialized = False
 
+# Corpora this deployment can answer from; chosen per request on /ask
+corpora = load_corpora(os.getenv("CORPORA_FILE", "./corpora.json"))
+default_corpus = os.getenv("DEFAULT_CORPUS", DEFAULT_CORPUS)
+
+# Corpus name -> read-only (vector index, BM25 index) pair; loaded once per
+# master process and inherited by forked workers
+shared_indexes = {}
+
+# Questions offered as buttons in the web interface; they get admission priority
+PREDEFINED_QUESTIONS = {
+    "When was Promtior founded?",
+    "What services does Promtior offer?",
+    "What results have Promtior clients achieved?",
+    "What does Promtior do?",
+    "What is GenAI Product Delivery?",
+    "What is RAG architecture?",
+    "How does Promtior help with automation?",
+    "What technologies does Promtior use?",
+    "What processes can Promtior automate?",
+    "What is GenAI Department as a service?",
+    "How can I contact Promtior?"
+}
+
+# Admission control for /ask (per worker process)
+admission = AdmissionController(
+    max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", 4)),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", 16)),
+    latency_budget=float(os.getenv("ADMISSION_LATENCY_BUDGET", 10)),
+    rate=float(os.getenv("RATE_LIMIT_PER_MINUTE", 30)) / 60,
+    burst=int(os.getenv("RATE_LIMIT_BURST", 10))
+)
+
+# Opt-in request profiling (off unless sampled or requested with the admin token)
+profiler = RequestProfiler(
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", 0)),
+    admin_token=os.getenv("PROFILE_ADMIN_TOKEN"),
+    directory=os.getenv("PROFILE_DIR", "./profiles"),
+    max_profiles=int(os.getenv("PROFILE_MAX_FILES", 50))
+)
+
 def get_content_hash(documents):
     """Generate hash of document content for cache validation"""
     content = json.dumps([doc.page_content for doc in documents], sort_keys=True)
     return hashlib.md5(content.encode()).hexdigest()
 
-def load_or_create_vectorstore(documents, embeddings, force_recreate=False):
-    """Load existing vectorstore or create new one if needed"""
+def split_documents(documents):
+    """Split documents into the chunks shared by the vector and lexical indexes"""
+    # Web sections are already compact; this only cuts oversized blocks
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=2000,
+        chunk_overlap=200
+    )
+    return text_splitter.split_documents(documents)
+
+def create_embeddings():
+    """Create an OpenAI embeddings client"""
+    return OpenAIEmbeddings(
+        model="text-embedding-3-small",
+        api_key=os.getenv("OPENAI_API_KEY"),
+        timeout=float(os.getenv("OPENAI_TIMEOUT", 30)),
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", 1))
+    )
+
+def load_cached_indexes(cache_dir, embeddings):
+    """Load a corpus' persisted indexes without scraping, or None if they are incomplete"""
+    try:
+        with open(f"{cache_dir}/content_hash.txt", 'r') as f:
+            stored_hash = f.read().strip()
+    except OSError:
+        return None
+    
+    bm25_index = BM25Index.load(f"{cache_dir}/bm25_index.json")
+    vector_index = SharedVectorIndex.load(f"{cache_dir}/shared", embeddings=embeddings)
+    if bm25_index is None or vector_index is None:
+        return None
+    if bm25_index.content_hash != stored_hash or vector_index.content_hash != stored_hash:
+        return None
+    
+    return vector_index, bm25_index
+
+@contextmanager
+def index_lock(cache_dir):
+    """Serialize loading or building a corpus' indexes across worker processes"""
+    lock_path = f"{os.path.normpath(cache_dir)}.lock"
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def load_or_create_vectorstore(documents, embeddings, force_recreate=False, cache_dir="./chroma_db"):
+    """Load existing vector and BM25 indexes or create new ones if needed.
+
+    Callers must hold index_lock(cache_dir).
+    """
     
-    cache_dir = "./chroma_db"
     hash_file = f"{cache_dir}/content_hash.txt"
+    index_file = f"{cache_dir}/bm25_index.json"
+    snapshot_dir = f"{cache_dir}/shared"
     current_hash = get_content_hash(documents)
     
     # Check if we should use existing cache
@@ -40,44 +149,173 @@ def load_or_create_vectorstore(documents, embeddings, force_recreate=False):
                 stored_hash = f.read().strip()
             
             if stored_hash == current_hash:
-                return Chroma(
-                    persist_directory=cache_dir,
-                    embedding_function=embeddings
-                )
+                # Rebuild the lexical index if it is missing or out of sync
+                bm25_index = BM25Index.load(index_file)
+                if bm25_index is None or bm25_index.content_hash != current_hash:
+                    bm25_index = BM25Index.from_documents(
+                        split_documents(documents),
+                        content_hash=current_hash
+                    )
+                    bm25_index.save(index_file)
+                
+                # Re-export the memory-mapped snapshot from Chroma if needed
+                vector_index = SharedVectorIndex.load(snapshot_dir, embeddings=embeddings)
+                if vector_index is None or vector_index.content_hash != current_hash:
+                    vectorstore = Chroma(
+                        persist_directory=cache_dir,
+                        embedding_function=embeddings
+                    )
+                    vector_index = SharedVectorIndex.from_chroma(
+                        vectorstore,
+                        snapshot_dir,
+                        embeddings=embeddings,
+                        content_hash=current_hash
+                    )
+                
+                return vector_index, bm25_index
         except Exception as e:
             pass  # Cache error, just recreate
     
-    # Create new vectorstore
+    # Create new vectorstore in a private directory next to the cache, then
+    # swap it into place so no reader ever sees a half-written index
+    parent_dir = os.path.dirname(os.path.abspath(cache_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(cache_dir)}.build-", dir=parent_dir)
     
-    # Clean old cache if exists
-    if os.path.exists(cache_dir):
-        import shutil
-        shutil.rmtree(cache_dir)
+    try:
+        # Split documents
+        split_docs = split_documents(documents)
+        
+        # Create vectorstore
+        vectorstore = Chroma.from_documents(
+            documents=split_docs,
+            embedding=embeddings,
+            persist_directory=build_dir
+        )
+        
+        # Build the lexical index over the same chunks
+        bm25_index = BM25Index.from_documents(split_docs, content_hash=current_hash)
+        
+        # Export the read-only snapshot that serving processes search; the
+        # mmap stays valid when its directory is renamed below
+        vector_index = SharedVectorIndex.from_chroma(
+            vectorstore,
+            f"{build_dir}/shared",
+            embeddings=embeddings,
+            content_hash=current_hash
+        )
+        
+        # Save content hash and lexical index for future validation
+        bm25_index.save(f"{build_dir}/bm25_index.json")
+        with open(f"{build_dir}/content_hash.txt", 'w') as f:
+            f.write(current_hash)
+        
+        # Drop Chroma's cached clients so none keeps pointing at the build
+        # directory or at the cache that is about to be replaced
+        del vectorstore
+        SharedSystemClient.clear_system_cache()
+        
+        # Swap the new index into place
+        if os.path.exists(cache_dir):
+            old_dir = f"{build_dir}.old"
+            os.replace(cache_dir, old_dir)
+            os.replace(build_dir, cache_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            os.replace(build_dir, cache_dir)
+    except Exception:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
     
-    # Split documents
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000,
-        chunk_overlap=200
+    return vector_index, bm25_index
+
+def load_indexes(corpus, force_recreate=False, refresh=True):
+    """Load or build a corpus' read-only indexes.
+
+    With refresh the site is scraped and the indexes rebuilt if its content
+    changed; otherwise indexes already on disk are used as they are.
+    """
+    with index_lock(corpus.index_dir):
+        # Another process may have built the indexes while we waited
+        if not refresh and not force_recreate:
+            indexes = load_cached_indexes(corpus.index_dir, create_embeddings())
+            if indexes is not None:
+                return indexes
+        
+        # 1. LOAD DATA FROM WEB SCRAPING
+        from scraper import get_website_content
+        documents = get_website_content(corpus.url, corpus.pdf_path)
+        
+        # 2. SMART VECTORSTORE LOADING
+        return load_or_create_vectorstore(
+            documents=documents, 
+            embeddings=create_embeddings(),
+            force_recreate=force_recreate,
+            cache_dir=corpus.index_dir
+        )
+
+def build_qa_chain(vector_index, bm25_index):
+    """Create this process's OpenAI clients and RAG chain over the shared indexes"""
+    
+    # 1. CONFIGURE CHAT MODEL
+    chat_model = ChatOpenAI(
+        model="gpt-4o-mini",
+        temperature=0,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        timeout=float(os.getenv("OPENAI_TIMEOUT", 30)),
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", 1))
     )
-    split_docs = text_splitter.split_documents(documents)
     
-    # Create vectorstore
-    vectorstore = Chroma.from_documents(
-        documents=split_docs,
-        embedding=embeddings,
-        persist_directory=cache_dir
+    # 2. CREATE RAG CHAIN
+    custom_prompt = PromptTemplate(
+        template="""Answer the question using only the information provided in the context below. 
+        Be direct and natural in your response. If the information is not available in the context, 
+        say "I don't have that information available."
+        
+        Context: {context}
+
+        Question: {question}
+
+        Answer:""",
+        input_variables=["context", "question"]
     )
     
-    # Save content hash for future validation
-    os.makedirs(cache_dir, exist_ok=True)
-    with open(hash_file, 'w') as f:
-        f.write(current_hash)
+    return RetrievalQA.from_chain_type(
+        llm=chat_model,
+        chain_type="stuff",
+        retriever=HybridRetriever(
+            vectorstore=vector_index.with_embeddings(create_embeddings()),
+            lexical_index=bm25_index,
+            k=int(os.getenv("RETRIEVAL_K", 5)),
+            lexical_only_max_terms=int(os.getenv("LEXICAL_FAST_PATH_TERMS", 2))
+        ),
+        return_source_documents=True,
+        chain_type_kwargs={"prompt": custom_prompt}
+    )
+
+def load_corpus_chain(name):
+    """Build the RAG chain for a corpus; used by corpus_cache on first use"""
+    corpus = corpora[name]
+    
+    # Indexes preloaded by the master stay referenced from shared_indexes
+    # regardless of eviction, so they do not count against the budget
+    if name in shared_indexes:
+        return build_qa_chain(*shared_indexes[name]), 0
     
-    return vectorstore
+    print(f"📚 Loading corpus '{name}'...")
+    indexes = load_indexes(corpus, refresh=False)
+    return build_qa_chain(*indexes), estimate_index_bytes(*indexes)
+
+# Loaded chains per corpus, evicted least recently used under the memory budget
+corpus_cache = CorpusCache(
+    load_corpus_chain,
+    memory_budget=int(float(os.getenv("CORPUS_MEMORY_BUDGET_MB", 512)) * 2**20),
+    retry_after=float(os.getenv("CORPUS_RETRY_SECONDS", 60))
+)
 
 def initialize_rag():
     """Initialize the RAG system"""
-    global qa_chain, is_initialized
+    global is_initialized
     
     if is_initialized:
         return True
@@ -85,51 +323,7 @@ def initialize_rag():
     try:
         print("🤖 Initializing Promtior AI Assistant...")
         
-        # 1. LOAD DATA FROM WEB SCRAPING
-        from scraper import get_website_content
-        documents = get_website_content()
-        
-        # 2. CREATE EMBEDDINGS
-        embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-small",
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
-        
-        # 3. SMART VECTORSTORE LOADING
-        vectorstore = load_or_create_vectorstore(
-            documents=documents, 
-            embeddings=embeddings,
-            force_recreate=False
-        )
-        
-        # 4. CONFIGURE CHAT MODEL
-        chat_model = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
-        
-        # 5. CREATE RAG CHAIN
-        custom_prompt = PromptTemplate(
-            template="""Answer the question using only the information provided in the context below. 
-            Be direct and natural in your response. If the information is not available in the context, 
-            say "I don't have that information available."
-            
-            Context: {context}
-
-            Question: {question}
-
-            Answer:""",
-            input_variables=["context", "question"]
-        )
-        
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=chat_model,
-            chain_type="stuff",
-            retriever=vectorstore.as_retriever(search_kwargs={"k": 10}),
-            return_source_documents=True,
-            chain_type_kwargs={"prompt": custom_prompt}
-        )
+        corpus_cache.get(default_corpus)
         
         is_initialized = True
         print("✅ RAG system initialized successfully!")
@@ -139,16 +333,45 @@ def initialize_rag():
         print(f"❌ Error initializing RAG system: {e}")
         return False
 
-def ask_question(question):
-    """Process a question through the RAG system"""
-    global qa_chain
+def preload_indexes(force_recreate=False):
+    """Load the shared indexes in the serving master before workers are forked"""
+    names = [name.strip() for name in os.getenv("PRELOAD_CORPORA", default_corpus).split(',') if name.strip()]
     
-    if not is_initialized:
-        if not initialize_rag():
-            return "❌ System not initialized. Please try again."
+    ok = True
+    for name in names:
+        try:
+            print(f"📦 Loading shared indexes for '{name}'...")
+            shared_indexes[name] = load_indexes(corpora[name], force_recreate=force_recreate)
+            print(f"✅ Shared indexes for '{name}' ready!")
+        except Exception as e:
+            # Workers fall back to loading the corpus on its first request
+            print(f"❌ Error loading shared indexes for '{name}': {e}")
+            ok = False
+    return ok
+
+def create_app():
+    """WSGI entry point for production servers (see gunicorn.conf.py)"""
+    preload_indexes()
+    return app
+
+def get_qa_chain(corpus=None):
+    """Return the RAG chain of a corpus, loading it on first use"""
+    corpus = corpus or default_corpus
     
+    if corpus == default_corpus and not is_initialized:
+        with span('initialize_rag'):
+            if not initialize_rag():
+                raise RuntimeError("System not initialized. Please try again.")
+    
+    with span('load_corpus'):
+        return corpus_cache.get(corpus)
+
+def ask_question(question, corpus=None, qa_chain=None):
+    """Process a question through the RAG system of the given corpus"""
     try:
-        result = qa_chain.invoke({"query": question})
+        if qa_chain is None:
+            qa_chain = get_qa_chain(corpus)
+        result = qa_chain.invoke({"query": question}, config=invoke_config())
         return result['result']
     except Exception as e:
         return f"❌ Error processing question: {e}"
@@ -355,7 +578,8 @@ HOME_TEMPLATE = """
                 });
                 
                 const data = await response.json();
-                answerText.innerHTML = `<strong>Q:</strong> ${question}<br><br><strong>A:</strong> ${data.answer}`;
+                const answer = response.ok ? data.answer : `❌ ${data.error}`;
+                answerText.innerHTML = `<strong>Q:</strong> ${question}<br><br><strong>A:</strong> ${answer}`;
             } catch (error) {
                 answerText.innerHTML = '❌ Error: Could not get response. Please try again.';
             }
@@ -379,15 +603,75 @@ def ask():
     if not question:
         return jsonify({'error': 'No question provided'}), 400
     
-    answer = ask_question(question)
+    corpus = data.get('corpus') or request.args.get('corpus') or default_corpus
+    if not isinstance(corpus, str):
+        return jsonify({'error': 'Corpus must be a string'}), 400
+    if corpus not in corpora:
+        return jsonify({'error': f'Unknown corpus: {corpus}'}), 404
+    
+    client_id = request.remote_addr or ''
+    # The predefined questions are Promtior's, so only they jump the queue
+    is_predefined = corpus == default_corpus and question in PREDEFINED_QUESTIONS
+    priority = PRIORITY_HIGH if is_predefined else PRIORITY_NORMAL
+    
+    try:
+        with profiler.profile(question, request.headers):
+            # A cold corpus can take minutes to scrape and embed. Load it
+            # before admission so it neither holds a slot nor skews the
+            # service time estimate used for load shedding.
+            try:
+                qa_chain = get_qa_chain(corpus)
+            except Exception as e:
+                return jsonify({'answer': f"❌ Error processing question: {e}"})
+            
+            with admission.admit(client_id, priority):
+                answer = ask_question(question, qa_chain=qa_chain)
+    except AdmissionRejected as e:
+        message = 'Too many requests' if e.status == 429 else 'Server is busy'
+        response = jsonify({'error': f'{message}, please retry in {e.retry_after}s', 'reason': e.reason})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, e.status
+    
     return jsonify({'answer': answer})
 
 @app.route('/health')
 def health():
     """Health check endpoint"""
-    return jsonify({'status': 'ok', 'initialized': is_initialized})
+    return jsonify({
+        'status': 'ok',
+        'initialized': is_initialized,
+        'pid': os.getpid(),
+        'admission': admission.stats(),
+        'corpora': corpus_cache.stats()
+    })
+
+def require_admin():
+    """Hide admin endpoints unless the request carries the admin token"""
+    if not profiler.is_admin(request.headers.get(ADMIN_HEADER)):
+        abort(404)
+
+@app.route('/admin/profiles')
+def list_profiles():
+    """List stored request profiles, newest first"""
+    require_admin()
+    return jsonify({'profiles': profiler.list_profiles()})
+
+@app.route('/admin/profiles/<profile_id>')
+def get_profile(profile_id):
+    """Span breakdown and top functions of one profile, or the raw .prof with ?format=prof"""
+    require_admin()
+    
+    ext = '.prof' if request.args.get('format') == 'prof' else '.json'
+    path = profiler.profile_path(profile_id, ext)
+    if path is None:
+        abort(404)
+    
+    if ext == '.prof':
+        return send_file(os.path.abspath(path), as_attachment=True, download_name=f"{profile_id}.prof")
+    return send_file(os.path.abspath(path), mimetype='application/json')
 
 if __name__ == '__main__':
     print("🚀 Starting Promtior AI Assistant Web App...")
+    preload_indexes()  # Scrape and refresh the preloaded corpora
     initialize_rag()  # Initialize on startup
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 8000)))
\ No newline at end of file
@@ -0,0 +1,148 @@
+# corpora.py - Corpus configuration and lazily loaded, LRU-evicted per-corpus state
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CORPUS = "promtior"
+
+CORPUS_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+class Corpus:
+    """One namespaced knowledge base: what to scrape and where its indexes live"""
+
+    def __init__(self, name, url, pdf_path=None, index_dir=None):
+        if not CORPUS_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid corpus name: {name!r}")
+
+        self.name = name
+        self.url = url
+        self.pdf_path = pdf_path
+        self.index_dir = index_dir or f"./corpora/{name}"
+
+def load_corpora(path):
+    """Read corpus definitions from a JSON file on top of the built-in Promtior corpus.
+
+    The file maps corpus names to {"url": ..., "pdf": ..., "index_dir": ...};
+    only "url" is required.
+    """
+    corpora = {
+        DEFAULT_CORPUS: Corpus(
+            DEFAULT_CORPUS,
+            "https://promtior.ai",
+            pdf_path="AI Engineer.pdf",
+            index_dir=os.getenv("CHROMA_DIR", "./chroma_db")
+        )
+    }
+
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for name, config in data.items():
+            corpora[name] = Corpus(
+                name,
+                config['url'],
+                pdf_path=config.get('pdf'),
+                index_dir=config.get('index_dir')
+            )
+
+    return corpora
+
+def estimate_index_bytes(vector_index, bm25_index):
+    """Rough resident size of a corpus' indexes, used for the memory budget"""
+    vector_bytes = vector_index.vectors.nbytes
+    # Document text is held once per index, plus per-object overhead
+    text_bytes = sum(len(doc.page_content) + 200 for doc in bm25_index.documents)
+    text_bytes += sum(len(doc.page_content) + 200 for doc in vector_index.documents)
+    postings_bytes = 100 * sum(len(postings) for postings in bm25_index.postings.values())
+    return vector_bytes + text_bytes + postings_bytes
+
+class CorpusCache:
+    """LRU cache of loaded corpora bounded by an estimated memory budget.
+
+    `loader(name)` returns (value, size_bytes). Each corpus is loaded at most
+    once at a time; concurrent requests for it wait for that load. A failed
+    load is remembered for `retry_after` seconds and reported without retrying, so a
+    broken corpus is not re-scraped on every request. The most recently used
+    corpus is never evicted, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, loader, memory_budget, retry_after=60.0):
+        self.loader = loader
+        self.memory_budget = memory_budget
+        self.retry_after = retry_after
+        self._entries = OrderedDict()  # name -> (value, size_bytes), LRU first
+        self._failures = {}  # name -> (error message, retry at monotonic time)
+        self._load_locks = {}
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def _lookup(self, name):
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        self._entries.move_to_end(name)
+        return entry[0]
+
+    def _recent_failure(self, name):
+        failure = self._failures.get(name)
+        if failure is None:
+            return None
+        if time.monotonic() >= failure[1]:
+            del self._failures[name]
+            return None
+        return failure[0]
+
+    def get(self, name):
+        """Return the loaded corpus, loading it (and evicting others) if needed"""
+        with self._lock:
+            value = self._lookup(name)
+            if value is not None:
+                return value
+            error = self._recent_failure(name)
+            if error is not None:
+                raise RuntimeError(f"Corpus '{name}' failed to load, retrying later: {error}")
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                value = self._lookup(name)
+                if value is not None:
+                    return value
+                # Requests that waited on a load that just failed share its error
+                error = self._recent_failure(name)
+                if error is not None:
+                    raise RuntimeError(f"Corpus '{name}' failed to load, retrying later: {error}")
+
+            try:
+                value, size = self.loader(name)
+            except Exception as e:
+                with self._lock:
+                    self._failures[name] = (str(e), time.monotonic() + self.retry_after)
+                raise
+
+            with self._lock:
+                self._entries[name] = (value, size)
+                self._evict()
+            return value
+
+    def _evict(self):
+        total = sum(size for _, size in self._entries.values())
+        while self.memory_budget and total > self.memory_budget and len(self._entries) > 1:
+            name, (_, size) = self._entries.popitem(last=False)
+            total -= size
+            self._evictions += 1
+            print(f"♻️ Evicted corpus '{name}' ({size / 2**20:.1f} MB)")
+
+    def stats(self):
+        """Loaded and recently failed corpora, estimated memory use and eviction count"""
+        with self._lock:
+            return {
+                'loaded': list(self._entries),
+                'memory_bytes': sum(size for _, size in self._entries.values()),
+                'memory_budget': self.memory_budget,
+                'evictions': self._evictions,
+                'failed': [name for name in list(self._failures) if self._recent_failure(name) is not None]
+            }
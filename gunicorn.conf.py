@@ -0,0 +1,68 @@
+# gunicorn.conf.py - Production server configuration
+#
+# Run with: gunicorn -c gunicorn.conf.py "app:create_app()"
+#
+# The app is preloaded in the master process, so the site is scraped and the
+# vector/BM25 indexes are loaded once. Workers are forked afterwards and only
+# create their own OpenAI clients and RAG chain.
+#
+# Only the vector matrix is truly shared: it is memory-mapped from
+# ./chroma_db/shared and every worker reads the same page-cache pages. The
+# BM25 postings and chunk texts are ordinary Python objects inherited at fork;
+# reading them updates refcounts, so each worker gradually ends up with its
+# own copy of those pages (small for a single site's worth of chunks).
+#
+# Send SIGHUP to the master to re-scrape, refresh the indexes and gracefully
+# replace the workers.
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+# In a container the CPU count is the host's, not the container's quota, and
+# every worker carries its own threads, OpenAI clients and corpus cache, so
+# default to a small fixed number and size it with WEB_CONCURRENCY
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+# Requests queued by the admission controller (admission.py) hold a thread
+# while they wait, so leave room for the running ones plus the queue, and a
+# few spare threads so overflow requests and /health still get a thread to
+# be answered (or rejected with 503/429) right away
+threads = int(os.environ.get(
+    'GUNICORN_THREADS',
+    int(os.environ.get('ADMISSION_MAX_CONCURRENCY', 4))
+    + int(os.environ.get('ADMISSION_MAX_QUEUE', 16))
+    + int(os.environ.get('GUNICORN_SPARE_THREADS', 4))
+))
+# gthread accepts up to worker_connections sockets and parks the ones without
+# a free thread in an unbounded executor queue, where they never reach the
+# admission controller. Capping connections at the thread count leaves any
+# excess in the listen backlog, where another worker can pick it up.
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', threads))
+
+# LLM calls can be slow; keep the worker timeout above the OpenAI timeout
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+def on_reload(server):
+    """Refresh the shared indexes in the master before new workers are forked"""
+    import app
+    app.preload_indexes()
+
+def pre_fork(server, worker):
+    """Keep GC passes from touching preloaded objects (refcount updates still copy pages)"""
+    gc.freeze()
+
+def post_fork(server, worker):
+    """Build this worker's OpenAI clients and RAG chain over the shared indexes"""
+    import app
+    app.initialize_rag()
@@ -0,0 +1,216 @@
+# lexical.py - BM25 inverted index and hybrid (lexical + vector) retrieval
+import json
+import math
+import os
+import re
+import heapq
+
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from langchain.schema import Document
+
+from profiling import span
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'did', 'do', 'does',
+    'for', 'from', 'has', 'have', 'how', 'i', 'in', 'is', 'it', 'its', 'me', 'of',
+    'on', 'or', 'our', 'that', 'the', 'their', 'this', 'to', 'was', 'we', 'were',
+    'what', 'when', 'where', 'which', 'who', 'why', 'with', 'you', 'your'
+}
+
+# Bumped whenever tokenize() changes so persisted indexes get rebuilt
+TOKENIZER_VERSION = 2
+
+def singularize(token):
+    """Map common English plurals onto their singular form"""
+    if len(token) <= 3:
+        return token
+    if token.endswith('ies') and len(token) > 4:
+        return token[:-3] + 'y'              # technologies -> technology
+    if token.endswith(('sses', 'xes', 'ches', 'shes')):
+        return token[:-2]                    # processes -> process
+    if token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]                    # services -> service
+    return token
+
+def tokenize(text):
+    """Lowercase, split into word tokens, drop stopwords and plurals"""
+    tokens = []
+    for token in re.findall(r"\w+", text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(singularize(token))
+    return tokens
+
+class BM25Index:
+    """In-memory inverted index scored with Okapi BM25"""
+
+    def __init__(self, documents, postings, doc_lengths, content_hash=None, k1=1.5, b=0.75):
+        self.documents = documents
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.content_hash = content_hash
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+
+    @classmethod
+    def from_documents(cls, documents, content_hash=None):
+        """Build the index from already split documents"""
+        postings = {}
+        doc_lengths = []
+
+        for doc_id, doc in enumerate(documents):
+            tokens = tokenize(doc.page_content)
+            doc_lengths.append(len(tokens))
+
+            term_freqs = {}
+            for token in tokens:
+                term_freqs[token] = term_freqs.get(token, 0) + 1
+            for term, freq in term_freqs.items():
+                postings.setdefault(term, []).append([doc_id, freq])
+
+        return cls(list(documents), postings, doc_lengths, content_hash=content_hash)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def knows_all(self, terms):
+        """Check whether every term appears somewhere in the index"""
+        return bool(terms) and all(term in self.postings for term in terms)
+
+    def idf(self, term):
+        """BM25 inverse document frequency of a term (0 for unknown terms)"""
+        postings = self.postings.get(term)
+        if not postings:
+            return 0.0
+        n_docs = len(self.documents)
+        df = len(postings)
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k=10):
+        """Return up to k (document, score) pairs ranked by BM25 score"""
+        terms = tokenize(query)
+        if not terms or not self.documents:
+            return []
+
+        scores = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            idf = self.idf(term)
+            for doc_id, freq in postings:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_doc_length
+                score = idf * freq * (self.k1 + 1) / (freq + self.k1 * length_norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.documents[doc_id], score) for doc_id, score in top]
+
+    def save(self, path):
+        """Persist the index as JSON next to the vectorstore"""
+        data = {
+            'tokenizer_version': TOKENIZER_VERSION,
+            'content_hash': self.content_hash,
+            'k1': self.k1,
+            'b': self.b,
+            'documents': [
+                {'page_content': doc.page_content, 'metadata': doc.metadata}
+                for doc in self.documents
+            ],
+            'postings': self.postings,
+            'doc_lengths': self.doc_lengths
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a persisted index, or None if it is missing or unreadable"""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # Postings built by an older tokenizer would not match new queries
+        if data.get('tokenizer_version') != TOKENIZER_VERSION:
+            return None
+
+        documents = [
+            Document(page_content=doc['page_content'], metadata=doc['metadata'])
+            for doc in data['documents']
+        ]
+        return cls(
+            documents,
+            data['postings'],
+            data['doc_lengths'],
+            content_hash=data.get('content_hash'),
+            k1=data.get('k1', 1.5),
+            b=data.get('b', 0.75)
+        )
+
+def document_key(doc):
+    """Identity used to merge the same chunk coming from different retrievers"""
+    return (doc.page_content, doc.metadata.get('source'))
+
+def reciprocal_rank_fusion(result_lists, k=60):
+    """Merge ranked document lists with reciprocal-rank fusion"""
+    scores = {}
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = document_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ranked]
+
+class HybridRetriever(BaseRetriever):
+    """Retriever combining BM25 and vector search results with RRF"""
+
+    vectorstore: VectorStore
+    lexical_index: BM25Index
+    k: int = 5
+    fetch_k: int = 12
+    rrf_k: int = 60
+    # Bare keyword queries ("contact email") with at most this many terms,
+    # all known to the index, skip the embedding call entirely (0 disables
+    # the fast path). Natural-language questions always use vector search.
+    lexical_only_max_terms: int = 2
+    # At least one term must be this selective (a term in a quarter of the
+    # chunks scores about 1.4) for lexical ranking alone to be trusted
+    lexical_only_min_idf: float = 1.0
+
+    def use_lexical_only(self, query):
+        """Decide whether a query is a short keyword query for the fast path"""
+        terms = tokenize(query)
+        if not 0 < len(terms) <= self.lexical_only_max_terms:
+            return False
+
+        # Any stopword or question word means a sentence, not keywords
+        if len(re.findall(r"\w+", query)) != len(terms):
+            return False
+
+        return (
+            self.lexical_index.knows_all(terms)
+            and max(self.lexical_index.idf(term) for term in terms) >= self.lexical_only_min_idf
+        )
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with span('lexical_search'):
+            lexical_results = [doc for doc, _ in self.lexical_index.search(query, k=self.fetch_k)]
+
+        if lexical_results and self.use_lexical_only(query):
+            return lexical_results[:self.k]
+
+        with span('vector_search'):
+            vector_results = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        with span('rank_fusion'):
+            fused = reciprocal_rank_fusion([lexical_results, vector_results], k=self.rrf_k)
+        return fused[:self.k]
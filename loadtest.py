@@ -0,0 +1,472 @@
+# loadtest.py - End-to-end load test for /ask against a mock OpenAI-compatible server
+#
+# Starts a local stub for /v1/embeddings and /v1/chat/completions, launches the
+# web app pointed at it (or targets an already running one with --target), then
+# drives /ask with an open-loop Poisson arrival process at each requested rate
+# and reports throughput, latency percentiles and error rates.
+#
+#   python loadtest.py --rates 1,5,10,20 --duration 30
+#   python loadtest.py --server gunicorn --chat-latency 2000 --error-rate 0.05
+#   python loadtest.py --mock-only --mock-port 9000   # just run the stub
+import argparse
+import base64
+import glob
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIM = 1536
+
+PREDEFINED_QUESTIONS = [
+    "When was Promtior founded?",
+    "What services does Promtior offer?",
+    "What results have Promtior clients achieved?",
+    "What does Promtior do?",
+    "What is GenAI Product Delivery?",
+    "What is RAG architecture?",
+    "How does Promtior help with automation?",
+    "What technologies does Promtior use?",
+    "What processes can Promtior automate?",
+    "What is GenAI Department as a service?",
+    "How can I contact Promtior?"
+]
+
+FREE_TEXT_QUESTIONS = [
+    "Who are the founders of Promtior?",
+    "Does Promtior work with companies outside Uruguay?",
+    "Can Promtior help us build a customer support chatbot?",
+    "What industries has Promtior worked with?",
+    "How long does a typical GenAI project take?",
+    "What is the difference between GenAI adoption consulting and product delivery?",
+    "Does Promtior offer training for internal teams?",
+    "How much money did clients save?",
+    "contact email",
+    "pricing"
+]
+
+# MOCK OPENAI SERVER
+
+class LatencyModel:
+    """Lognormal latency around a median (sigma 0 means a fixed delay)"""
+
+    def __init__(self, median_ms, sigma=0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+
+    def sample(self):
+        if self.median_ms <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median_ms / 1000
+        return random.lognormvariate(math.log(self.median_ms), self.sigma) / 1000
+
+def fake_embedding(item):
+    """Deterministic bag-of-words style vector so similar texts stay similar"""
+    if isinstance(item, str):
+        tokens = re.findall(r"\w+", item.lower())
+    else:
+        tokens = [str(token) for token in item]  # pre-tokenized input ids
+
+    vector = [0.0] * EMBEDDING_DIM
+    for token in tokens or ['']:
+        digest = hashlib.md5(token.encode()).digest()
+        index = int.from_bytes(digest[:4], 'little') % EMBEDDING_DIM
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible API; behaviour comes from server.config"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_error(self):
+        """Maybe fail the request; return True if an error response was sent"""
+        config = self.server.config
+        roll = random.random()
+        if roll < config.error_rate:
+            self._send_json(500, {'error': {'message': 'mock server error', 'type': 'server_error'}})
+            return True
+        if roll < config.error_rate + config.rate_limit_rate:
+            self._send_json(429, {'error': {'message': 'mock rate limit', 'type': 'rate_limit_error'}})
+            return True
+        if roll < config.error_rate + config.rate_limit_rate + config.hang_rate:
+            time.sleep(config.hang_seconds)
+            self._send_json(504, {'error': {'message': 'mock timeout', 'type': 'timeout'}})
+            return True
+        return False
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [
+                {'id': 'gpt-4o-mini', 'object': 'model'},
+                {'id': 'text-embedding-3-small', 'object': 'model'}
+            ]})
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+
+        if self.path.endswith('/embeddings'):
+            self._handle_embeddings(payload)
+        elif self.path.endswith('/chat/completions'):
+            self._handle_chat(payload)
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def _handle_embeddings(self, payload):
+        config = self.server.config
+        time.sleep(config.embed_latency.sample())
+        if self._inject_error():
+            return
+
+        inputs = payload.get('input', [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        data = []
+        for index, item in enumerate(inputs):
+            vector = fake_embedding(item)
+            if payload.get('encoding_format') == 'base64':
+                vector = base64.b64encode(struct.pack(f'<{len(vector)}f', *vector)).decode()
+            data.append({'object': 'embedding', 'index': index, 'embedding': vector})
+
+        tokens = sum(len(item) if not isinstance(item, str) else len(item.split()) for item in inputs)
+        self._send_json(200, {
+            'object': 'list',
+            'data': data,
+            'model': payload.get('model', 'text-embedding-3-small'),
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}
+        })
+
+    def _handle_chat(self, payload):
+        config = self.server.config
+        time.sleep(config.chat_latency.sample())
+        if self._inject_error():
+            return
+
+        messages = payload.get('messages', [])
+        question = messages[-1].get('content', '') if messages else ''
+        answer = f"Mock answer ({len(question)} prompt chars)."
+        model = payload.get('model', 'gpt-4o-mini')
+        created = int(time.time())
+
+        if not payload.get('stream'):
+            self._send_json(200, {
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': answer},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {'prompt_tokens': len(question.split()), 'completion_tokens': len(answer.split()),
+                          'total_tokens': len(question.split()) + len(answer.split())}
+            })
+            return
+
+        # Server-sent events, one word per chunk
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        def send_chunk(delta, finish_reason=None):
+            chunk = {
+                'id': 'chatcmpl-mock',
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        send_chunk({'role': 'assistant', 'content': ''})
+        for word in answer.split(' '):
+            time.sleep(config.stream_chunk_delay_ms / 1000)
+            send_chunk({'content': word + ' '})
+        send_chunk({}, finish_reason='stop')
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+def start_mock_server(config, port=0):
+    """Start the mock OpenAI server in a background thread; return (server, base_url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+# APP UNDER TEST
+
+def remove_app_cache(cache_dir):
+    """Delete the app's index directory plus the lock file and build dirs the app keeps beside it"""
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    parent_dir, name = os.path.split(os.path.normpath(cache_dir))
+    for path in glob.glob(os.path.join(parent_dir, f".{name}.build-*")):
+        shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.remove(f"{os.path.normpath(cache_dir)}.lock")
+    except OSError:
+        pass
+
+def launch_app(args, base_url):
+    """Start the web app pointed at the mock server and wait until it is healthy"""
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    cache_dir = tempfile.mkdtemp(prefix='loadtest_chroma_')
+
+    env = dict(os.environ)
+    env.update({
+        'OPENAI_API_KEY': 'sk-mock',
+        'OPENAI_BASE_URL': base_url,
+        'OPENAI_API_BASE': base_url,
+        # Keep mock embeddings out of the real cache
+        'CHROMA_DIR': cache_dir,
+        'PORT': str(args.port)
+    })
+
+    if args.server == 'gunicorn':
+        command = ['gunicorn', '-c', 'gunicorn.conf.py', 'app:create_app()']
+    else:
+        command = [sys.executable, 'app.py']
+
+    output = None if args.verbose else subprocess.DEVNULL
+    process = subprocess.Popen(command, cwd=repo_dir, env=env, stdout=output, stderr=output)
+
+    target = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            remove_app_cache(cache_dir)
+            raise RuntimeError(f"App exited during startup with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{target}/health", timeout=2) as response:
+                if response.status == 200:
+                    return process, target, cache_dir
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+
+    process.terminate()
+    remove_app_cache(cache_dir)
+    raise RuntimeError("App did not become healthy in time")
+
+# LOAD GENERATOR
+
+def pick_question(predefined_ratio):
+    if random.random() < predefined_ratio:
+        return random.choice(PREDEFINED_QUESTIONS)
+    return random.choice(FREE_TEXT_QUESTIONS)
+
+def send_question(target, question, client_id, timeout):
+    """POST one question; return (status, seconds) with status 0 for client errors"""
+    body = json.dumps({'question': question}).encode()
+    request = urllib.request.Request(
+        f"{target}/ask",
+        data=body,
+        headers={'Content-Type': 'application/json', 'X-Forwarded-For': client_id},
+        method='POST'
+    )
+
+    start = time.monotonic()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = json.loads(response.read())
+            # ask_question reports upstream failures as a 200 with an error answer
+            status = 500 if str(data.get('answer', '')).startswith('❌') else response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return status, time.monotonic() - start
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def run_level(target, rate, duration, args):
+    """Drive /ask open-loop at `rate` requests/second for `duration` seconds"""
+    results = []
+    lock = threading.Lock()
+    in_flight = 0
+    peak_in_flight = 0
+    threads = []
+
+    def worker(question, client_id):
+        nonlocal in_flight
+        status, elapsed = send_question(target, question, client_id, args.request_timeout)
+        with lock:
+            results.append((status, elapsed))
+            in_flight -= 1
+
+    start = time.monotonic()
+    next_arrival = start
+    while next_arrival - start < duration:
+        delay = next_arrival - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        with lock:
+            in_flight += 1
+            peak_in_flight = max(peak_in_flight, in_flight)
+
+        # One thread per arrival keeps the load open-loop: slow responses never delay new arrivals.
+        # The fake X-Forwarded-For spreads load over several rate-limit buckets; the app trusts
+        # it here only because no real proxy sits between the harness and the app
+        thread = threading.Thread(
+            target=worker,
+            args=(pick_question(args.predefined_ratio), f"10.0.0.{random.randrange(args.clients)}"),
+            daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+        next_arrival += random.expovariate(rate)
+
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - start
+
+    ok = sorted(elapsed for status, elapsed in results if status == 200)
+    errors = {}
+    for status, _ in results:
+        if status != 200:
+            key = str(status) if status else 'conn'
+            errors[key] = errors.get(key, 0) + 1
+
+    return {
+        'rate': rate,
+        'sent': len(results),
+        'ok': len(ok),
+        'throughput': len(ok) / wall if wall else 0.0,
+        'p50': percentile(ok, 50),
+        'p95': percentile(ok, 95),
+        'p99': percentile(ok, 99),
+        'error_rate': (len(results) - len(ok)) / len(results) if results else 0.0,
+        'errors': errors,
+        'peak_in_flight': peak_in_flight
+    }
+
+def format_ms(seconds):
+    return '-' if seconds is None else f"{seconds * 1000:.0f}"
+
+def print_report(rows):
+    print("\n" + "=" * 96)
+    print(f"{'rate/s':>7} {'sent':>6} {'ok':>6} {'tput/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'err %':>6} {'peak':>5}  errors")
+    print("-" * 96)
+    for row in rows:
+        errors = ', '.join(f"{code}:{count}" for code, count in sorted(row['errors'].items())) or '-'
+        print(f"{row['rate']:>7g} {row['sent']:>6} {row['ok']:>6} {row['throughput']:>8.2f} "
+              f"{format_ms(row['p50']):>8} {format_ms(row['p95']):>8} {format_ms(row['p99']):>8} "
+              f"{row['error_rate'] * 100:>6.1f} {row['peak_in_flight']:>5}  {errors}")
+    print("=" * 96)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test /ask against a mock OpenAI server")
+    parser.add_argument('--rates', default='1,2,5,10', help="Comma-separated arrival rates (requests/second)")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds per rate level")
+    parser.add_argument('--predefined-ratio', type=float, default=0.6, help="Share of predefined questions")
+    parser.add_argument('--clients', type=int, default=50, help="Distinct client addresses to spread requests over")
+    parser.add_argument('--request-timeout', type=float, default=60)
+    parser.add_argument('--target', help="Use an already running app instead of launching one")
+    parser.add_argument('--server', choices=['dev', 'gunicorn'], default='dev')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--startup-timeout', type=float, default=180)
+    parser.add_argument('--mock-port', type=int, default=0)
+    parser.add_argument('--mock-only', action='store_true', help="Only run the mock OpenAI server")
+    parser.add_argument('--chat-latency', type=float, default=800, help="Median chat latency (ms)")
+    parser.add_argument('--embed-latency', type=float, default=50, help="Median embeddings latency (ms)")
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="Lognormal sigma (0 = fixed latency)")
+    parser.add_argument('--stream-chunk-delay', type=float, default=20, help="Delay between streamed chunks (ms)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of mock calls failing with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Share of mock calls failing with 429")
+    parser.add_argument('--hang-rate', type=float, default=0.0, help="Share of mock calls that hang")
+    parser.add_argument('--hang-seconds', type=float, default=60)
+    parser.add_argument('--verbose', action='store_true', help="Show the app's output")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    config = argparse.Namespace(
+        chat_latency=LatencyModel(args.chat_latency, args.latency_sigma),
+        embed_latency=LatencyModel(args.embed_latency, args.latency_sigma),
+        stream_chunk_delay_ms=args.stream_chunk_delay,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds
+    )
+    mock_server, base_url = start_mock_server(config, args.mock_port)
+    print(f"🧪 Mock OpenAI server at {base_url}")
+
+    if args.mock_only:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return
+
+    process = None
+    cache_dir = None
+    try:
+        if args.target:
+            target = args.target.rstrip('/')
+        else:
+            print(f"🚀 Launching app ({args.server}) on port {args.port}...")
+            process, target, cache_dir = launch_app(args, base_url)
+
+        rows = []
+        for rate in [float(r) for r in args.rates.split(',') if r.strip()]:
+            print(f"📈 {rate:g} req/s for {args.duration:g}s...")
+            rows.append(run_level(target, rate, args.duration, args))
+
+        print_report(rows)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if cache_dir:
+            remove_app_cache(cache_dir)
+        mock_server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# profiling.py - Opt-in per-request profiling for the /ask path
+#
+# A request is profiled when it is sampled (PROFILE_SAMPLE_RATE) or carries an
+# `X-Profile: <PROFILE_ADMIN_TOKEN>` header. Profiled requests get a cProfile
+# trace plus a span breakdown (retrieval, embedding, LLM call, ...). Both are
+# written to a bounded ring of files in PROFILE_DIR and listed through the
+# /admin/profiles endpoints. When nothing is sampled, span() and
+# invoke_config() only do a context-variable lookup.
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+PROFILE_HEADER = 'X-Profile'
+ADMIN_HEADER = 'X-Admin-Token'
+
+_current_trace = ContextVar('profiling_trace', default=None)
+
+# From Python 3.12 cProfile is built on sys.monitoring, which observes every
+# thread in the process; before that it only sees the thread that enabled it.
+# Under gthread workers a 3.12+ trace therefore also contains whatever other
+# requests ran on the same worker meanwhile. Spans are always per request.
+PROFILER_SCOPE = 'process' if sys.version_info >= (3, 12) else 'thread'
+
+class Trace:
+    """Spans recorded for one profiled request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, start, end):
+        with self._lock:
+            self.spans.append({
+                'name': name,
+                'start_ms': round((start - self.start) * 1000, 2),
+                'duration_ms': round((end - start) * 1000, 2)
+            })
+
+@contextmanager
+def span(name):
+    """Time a block as a named span of the current trace (no-op when not profiling)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter())
+
+class SpanCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain chain, retriever and LLM runs into trace spans"""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self._runs = {}
+
+    def _start(self, kind, serialized, run_id, kwargs):
+        name = kwargs.get('name') or (serialized or {}).get('name') or kind
+        self._runs[run_id] = (f"{kind}:{name}", time.perf_counter())
+
+    def _end(self, run_id):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            self.trace.add(run[0], run[1], time.perf_counter())
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        self._start('chain', serialized, run_id, kwargs)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start('retriever', serialized, run_id, kwargs)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start('llm', serialized, run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start('llm', serialized, run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+def invoke_config():
+    """Runnable config adding span callbacks when the request is being profiled"""
+    trace = _current_trace.get()
+    if trace is None:
+        return {}
+    return {'callbacks': [SpanCallbackHandler(trace)]}
+
+class RequestProfiler:
+    """Decides which requests to profile and stores their traces in a file ring"""
+
+    def __init__(self, sample_rate=0.0, admin_token=None, directory="./profiles", max_profiles=50):
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.directory = directory
+        self.max_profiles = max_profiles
+        # Only one cProfile profiler can be active per process at a time
+        # (and from 3.12 it sees all threads anyway, see PROFILER_SCOPE)
+        self._busy = threading.Lock()
+
+    def is_admin(self, token):
+        """Check a token against the admin token (always False when unset)"""
+        if not (self.admin_token and token):
+            return False
+        # compare_digest rejects non-ASCII str; headers arrive latin-1 decoded
+        return hmac.compare_digest(token.encode('utf-8'), self.admin_token.encode('utf-8'))
+
+    def _trigger(self, headers):
+        if self.admin_token and PROFILE_HEADER in headers:
+            if self.is_admin(headers.get(PROFILE_HEADER)):
+                return 'header'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    @contextmanager
+    def profile(self, label, headers):
+        """Profile the enclosed block if this request is sampled or requested"""
+        trigger = self._trigger(headers)
+        if trigger is None or not self._busy.acquire(blocking=False):
+            yield
+            return
+
+        trace = Trace()
+        token = _current_trace.set(trace)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                duration = time.perf_counter() - trace.start
+        finally:
+            _current_trace.reset(token)
+            self._busy.release()
+
+        try:
+            self._save(label, trigger, duration, trace, profiler)
+        except OSError as e:
+            print(f"❌ Error saving profile: {e}")
+
+    def _save(self, label, trigger, duration, trace, profiler):
+        os.makedirs(self.directory, exist_ok=True)
+        # Ids sort chronologically, which is what the ring relies on for eviction
+        now = time.time()
+        timestamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(now)) + f"{int(now * 1000) % 1000:03d}"
+        profile_id = f"{timestamp}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        profiler.dump_stats(f"{self.directory}/{profile_id}.prof")
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(30)
+
+        with open(f"{self.directory}/{profile_id}.json", 'w') as f:
+            json.dump({
+                'id': profile_id,
+                'label': label,
+                'trigger': trigger,
+                'created': now,
+                'pid': os.getpid(),
+                'thread_id': threading.get_ident(),
+                'profiler_scope': PROFILER_SCOPE,
+                'duration_ms': round(duration * 1000, 2),
+                'spans': sorted(trace.spans, key=lambda s: s['start_ms']),
+                'top_functions': summary.getvalue()
+            }, f)
+
+        self._trim()
+
+    def _trim(self):
+        """Drop the oldest profiles beyond max_profiles"""
+        traces = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        for name in traces[:max(0, len(traces) - self.max_profiles)]:
+            for ext in ('.json', '.prof'):
+                try:
+                    os.remove(f"{self.directory}/{name[:-len('.json')]}{ext}")
+                except OSError:
+                    pass
+
+    def list_profiles(self):
+        """Summaries of stored profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(f"{self.directory}/{name}", 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # Removed or still being written by another worker
+            data.pop('top_functions', None)
+            profiles.append(data)
+        return profiles
+
+    def profile_path(self, profile_id, ext):
+        """Path of a stored profile file, or None if the id is invalid or missing"""
+        if not profile_id or os.path.basename(profile_id) != profile_id or profile_id.startswith('.'):
+            return None
+        path = f"{self.directory}/{profile_id}{ext}"
+        return path if os.path.exists(path) else None
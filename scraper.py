@@ -1,16 +1,23 @@
 # scraper.py - Clean and silent web scraper for promtior.ai
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, CData, NavigableString
 import os
 from langchain.schema import Document
 
-def extract_pdf_content():
+HEADING_TAGS = ['h1', 'h2', 'h3', 'h4']
+TEXT_TAGS = ['p', 'li']
+
+UNWANTED_PATTERNS = [
+    'cookie', 'privacy policy', 'terms of service',
+    'subscribe', 'newsletter', 'follow us'
+]
+
+def extract_pdf_content(pdf_path="AI Engineer.pdf"):
     """Extract actual content from the technical test PDF"""
     try:
         import PyPDF2
         
-        pdf_path = "AI Engineer.pdf"
-        if not os.path.exists(pdf_path):
+        if not pdf_path or not os.path.exists(pdf_path):
             return []
         
         with open(pdf_path, 'rb') as file:
@@ -43,28 +50,41 @@ def extract_pdf_content():
     except Exception as e:
         return []
 
-def clean_and_filter_text(text):
+def clean_and_filter_text(text, min_length=20):
     """Clean text and filter out unwanted content"""
-    if not text or len(text) < 20:
-        return None
-    
     # Normalize whitespace
-    text = ' '.join(text.split())
+    text = ' '.join((text or '').split())
+    if not text or len(text) < min_length:
+        return None
     
     # Filter out unwanted content
-    unwanted_patterns = [
-        'cookie', 'privacy policy', 'terms of service',
-        'subscribe', 'newsletter', 'follow us'
-    ]
-    
-    if any(pattern in text.lower() for pattern in unwanted_patterns):
+    if any(pattern in text.lower() for pattern in UNWANTED_PATTERNS):
         return None
     
     return text.strip()
 
-def extract_web_content():
-    """Extract content from promtior.ai website"""
-    url = "https://promtior.ai"
+def clean_heading_text(text):
+    """Normalize heading text; headings are short so no length filter applies"""
+    text = ' '.join((text or '').split())
+    if not text or any(pattern in text.lower() for pattern in UNWANTED_PATTERNS):
+        return None
+    return text
+
+def block_text(element):
+    """Text of a p/li that is not inside a nested heading or text block.
+
+    Nested blocks are visited on their own, so each piece of text is
+    captured exactly once and in document order.
+    """
+    block_tags = HEADING_TAGS + TEXT_TAGS
+    # Only real text, as get_text() does: no comments, doctypes or the like
+    return ' '.join(
+        str(string) for string in element.find_all(string=True)
+        if type(string) in (NavigableString, CData) and string.find_parent(block_tags) is element
+    )
+
+def extract_web_sections(url="https://promtior.ai"):
+    """Extract content from the website grouped by its heading hierarchy"""
     headers = {
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
@@ -78,98 +98,106 @@ def extract_web_content():
     for element in soup(['script', 'style', 'nav', 'footer', 'header']):
         element.decompose()
     
-    # Extract text from relevant elements
-    content_pieces = []
-    for element in soup.find_all(['h1', 'h2', 'h3', 'h4', 'p', 'li']):
-        text = clean_and_filter_text(element.get_text())
-        if text:
-            content_pieces.append(text)
+    # Walk headings and text blocks in document order, tracking the heading path
+    heading_stack = []  # (level, text)
+    sections = [{'heading_path': [], 'content': []}]
+    
+    for element in soup.find_all(HEADING_TAGS + TEXT_TAGS):
+        # Headings open a section even inside list items, e.g. service cards
+        # written as <li><h3>Title</h3><p>...</p></li>
+        if element.name in HEADING_TAGS:
+            heading = clean_heading_text(element.get_text(' '))
+            if not heading:
+                continue
+            
+            level = int(element.name[1])
+            while heading_stack and heading_stack[-1][0] >= level:
+                heading_stack.pop()
+            heading_stack.append((level, heading))
+            
+            sections.append({
+                'heading_path': [text for _, text in heading_stack],
+                'content': []
+            })
+        else:
+            # Under a heading even one-word items ("Python", "Azure") are
+            # content; only headless page text gets the noise length filter
+            min_length = 1 if sections[-1]['heading_path'] else 20
+            text = clean_and_filter_text(block_text(element), min_length=min_length)
+            if text:
+                sections[-1]['content'].append(text)
+    
+    # Empty sections are kept only when they are leaves, so a lone heading
+    # still reaches the index; parent headings live on in their children's path
+    kept = []
+    for i, section in enumerate(sections):
+        if section['content']:
+            kept.append(section)
+            continue
+        
+        path = section['heading_path']
+        next_path = sections[i + 1]['heading_path'] if i + 1 < len(sections) else []
+        is_parent = len(next_path) > len(path) and next_path[:len(path)] == path
+        if path and not is_parent:
+            kept.append(section)
     
-    return content_pieces
+    return kept
 
-def create_structured_documents(content_pieces):
-    """Convert raw content into structured documents for better retrieval"""
+def create_section_documents(sections, max_chars=1000):
+    """Turn heading sections into compact chunks, packing whole text blocks"""
     documents = []
     
-    # Categorize content
-    services_content = []
-    results_content = []
-    company_content = []
-    individual_content = []
-    
-    for content in content_pieces:
-        content_lower = content.lower()
+    for section_index, section in enumerate(sections):
+        heading_path = section['heading_path']
+        heading = ' > '.join(heading_path)
         
-        # Services
-        if any(keyword in content_lower for keyword in [
-            'genai product delivery', 'genai department', 'genai adoption',
-            'service', 'delivery', 'consulting'
-        ]):
-            services_content.append(content)
+        # Group whole text blocks into chunks of up to max_chars; a single
+        # oversized block becomes its own chunk instead of being cut
+        groups = []
+        current = []
+        current_len = 0
+        for text in section['content']:
+            if current and current_len + len(text) + 1 > max_chars:
+                groups.append(current)
+                current = []
+                current_len = 0
+            current.append(text)
+            current_len += len(text) + 1
+        if current or not groups:
+            groups.append(current)
         
-        # Results and achievements
-        elif any(keyword in content_lower for keyword in [
-            'million', 'reduction', 'savings', 'achieved', 'results'
-        ]):
-            results_content.append(content)
-        
-        # Company information
-        elif any(keyword in content_lower for keyword in [
-            'promtior', 'company', 'founded', 'business'
-        ]):
-            company_content.append(content)
-        
-        # Individual valuable content
-        else:
-            individual_content.append(content)
-    
-    # Create focused documents
-    
-    # Services document
-    if services_content:
-        services_text = "Promtior offers three main services: " + " ".join(services_content[:3])
-        documents.append(Document(
-            page_content=services_text,
-            metadata={'source': 'website', 'type': 'services'}
-        ))
-    
-    # Results document
-    if results_content:
-        results_text = "Promtior clients have achieved significant results: " + " ".join(results_content[:2])
-        documents.append(Document(
-            page_content=results_text,
-            metadata={'source': 'website', 'type': 'results'}
-        ))
-    
-    # Company document
-    if company_content:
-        company_text = "About Promtior: " + " ".join(company_content[:2])
-        documents.append(Document(
-            page_content=company_text,
-            metadata={'source': 'website', 'type': 'company'}
-        ))
-    
-    # Individual content pieces (for better retrieval coverage)
-    for i, content in enumerate(individual_content[:8]):
-        documents.append(Document(
-            page_content=content,
-            metadata={'source': 'website', 'section': f'content_{i}'}
-        ))
+        for chunk_index, group in enumerate(groups):
+            body = ' '.join(group)
+            page_content = f"{heading}\n{body}".strip() if heading else body
+            if not page_content:
+                continue
+            
+            documents.append(Document(
+                page_content=page_content,
+                metadata={
+                    'source': 'website',
+                    'type': 'section',
+                    'heading': heading,
+                    'heading_level': len(heading_path),
+                    'section': section_index,
+                    'chunk': chunk_index
+                }
+            ))
     
     return documents
 
-def scrape_promtior_website():
+def scrape_promtior_website(url="https://promtior.ai", pdf_path="AI Engineer.pdf"):
     """Main scraping function - completely silent"""
     
     try:
         # Extract content from website
-        content_pieces = extract_web_content()
+        sections = extract_web_sections(url)
         
-        # Create structured documents
-        web_documents = create_structured_documents(content_pieces)
+        # Create one compact chunk per section
+        web_documents = create_section_documents(sections)
         
         # Add PDF content for extra points
-        pdf_documents = extract_pdf_content()
+        pdf_documents = extract_pdf_content(pdf_path)
         
         # Combine all documents
         all_documents = web_documents + pdf_documents
@@ -179,9 +207,9 @@ def scrape_promtior_website():
     except requests.RequestException as e:
         raise Exception(f"Web scraping failed: {e}")
 
-def get_website_content():
+def get_website_content(url="https://promtior.ai", pdf_path="AI Engineer.pdf"):
     """Main entry point for getting website content"""
-    return scrape_promtior_website()
+    return scrape_promtior_website(url, pdf_path)
 
 if __name__ == "__main__":
     # Solo para testing - no se ejecuta cuando se importa
@@ -0,0 +1,110 @@
+# shared_index.py - Read-only, memory-mapped vector index shared across worker processes
+import json
+import os
+
+import numpy as np
+from langchain_core.vectorstores import VectorStore
+from langchain.schema import Document
+
+from profiling import span
+
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.json"
+
+class SharedVectorIndex(VectorStore):
+    """Exact cosine search over a memory-mapped, normalized embedding matrix.
+
+    The matrix is exported once from Chroma and opened with mmap, so every
+    process that loads it (or forks after loading it) reads the same pages
+    from the OS page cache instead of holding its own copy of the index.
+    """
+
+    def __init__(self, vectors, documents, embeddings=None, content_hash=None):
+        self.vectors = vectors
+        self.documents = documents
+        self.content_hash = content_hash
+        self._embeddings = embeddings
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    def with_embeddings(self, embeddings):
+        """Return a view sharing the same matrix but using another embeddings client"""
+        return SharedVectorIndex(
+            self.vectors,
+            self.documents,
+            embeddings=embeddings,
+            content_hash=self.content_hash
+        )
+
+    @classmethod
+    def from_chroma(cls, vectorstore, path, embeddings=None, content_hash=None):
+        """Export a Chroma collection to disk and load it back memory-mapped"""
+        data = vectorstore.get(include=["embeddings", "documents", "metadatas"])
+
+        vectors = np.asarray(data["embeddings"], dtype=np.float32)
+        if vectors.size:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+
+        os.makedirs(path, exist_ok=True)
+        vectors_tmp = f"{path}/{VECTORS_FILE}.tmp"
+        with open(vectors_tmp, 'wb') as f:
+            np.save(f, vectors)
+        os.replace(vectors_tmp, f"{path}/{VECTORS_FILE}")
+
+        documents_tmp = f"{path}/{DOCUMENTS_FILE}.tmp"
+        with open(documents_tmp, 'w') as f:
+            json.dump({
+                'content_hash': content_hash,
+                'documents': [
+                    {'page_content': text, 'metadata': metadata or {}}
+                    for text, metadata in zip(data["documents"], data["metadatas"])
+                ]
+            }, f)
+        os.replace(documents_tmp, f"{path}/{DOCUMENTS_FILE}")
+
+        return cls.load(path, embeddings=embeddings)
+
+    @classmethod
+    def load(cls, path, embeddings=None):
+        """Open a persisted snapshot, or None if it is missing or unreadable"""
+        try:
+            vectors = np.load(f"{path}/{VECTORS_FILE}", mmap_mode='r')
+            with open(f"{path}/{DOCUMENTS_FILE}", 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        documents = [
+            Document(page_content=doc['page_content'], metadata=doc['metadata'])
+            for doc in data['documents']
+        ]
+        if len(documents) != len(vectors):
+            return None
+
+        return cls(vectors, documents, embeddings=embeddings, content_hash=data.get('content_hash'))
+
+    def similarity_search(self, query, k=4, **kwargs):
+        """Return the k documents closest to the query embedding"""
+        k = min(k, len(self.documents))
+        if k <= 0:
+            return []
+
+        with span('embed_query'):
+            query_vector = np.asarray(self._embeddings.embed_query(query), dtype=np.float32)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+
+        with span('vector_scan'):
+            scores = self.vectors @ query_vector
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+        return [self.documents[i] for i in top]
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("SharedVectorIndex is read-only; rebuild it from Chroma")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("SharedVectorIndex is built with from_chroma")